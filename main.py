@@ -1,6 +1,13 @@
+from __future__ import annotations
+
 import os
+from typing import Callable
+
 import openai
+import requests
+from requests.adapters import HTTPAdapter
 
+from story_studio.cache import PromptCache
 from story_studio.controller import run_story_session
 
 """
@@ -9,16 +16,67 @@ Before submitting the assignment, describe here in a few sentences what you woul
 """
 
 
-def call_model(prompt: str, max_tokens=3000, temperature=0.1) -> str:
-    openai.api_key = os.getenv("OPENAI_API_KEY")  # do not hardcode keys
+MODEL = "gpt-3.5-turbo"
+
+openai.api_key = os.getenv("OPENAI_API_KEY")  # do not hardcode keys; read once at import
+
+# openai 0.x already keeps one keep-alive session per thread. Sharing a single pooled
+# session lets worker threads (speculative revise) reuse the main thread's warm
+# connections instead of opening their own. Whichever thread recycles it after the
+# SDK's session lifetime only clears the pool, so the next call reconnects.
+# max_retries matches the SDK's default adapter, which a custom session replaces.
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=2))
+openai.requestssession = http_session
+
+
+# exact-match cache: repeated identical requests skip the LLM
+cache = PromptCache(cache_dir="story_studio/cache")
+
+
+def call_model(
+    prompt: str,
+    max_tokens=3000,
+    temperature=0.1,
+    n: int = 1,
+    stream: bool = False,
+    on_chunk: Callable[[str], None] | None = None,
+) -> str | list[str]:
+    """One chat completion; with n>1, returns n candidates from a single request.
+
+    With stream=True, text deltas of the first candidate are passed to `on_chunk`
+    as they arrive; the return value is the same as the non-streaming call.
+    """
+    cached = cache.get(prompt, MODEL, temperature, max_tokens, n)
+    if cached is not None:
+        if stream and on_chunk is not None:
+            on_chunk(cached if n == 1 else cached[0])
+        return cached
+
     resp = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
+        model=MODEL,
         messages=[{"role": "user", "content": prompt}],
-        stream=False,
+        stream=stream,
         max_tokens=max_tokens,
         temperature=temperature,
+        n=n,
     )
-    return resp.choices[0].message["content"]  # type: ignore
+    if stream:
+        parts: list[list[str]] = [[] for _ in range(n)]
+        for chunk in resp:
+            for choice in chunk.choices:  # type: ignore
+                text = choice.delta.get("content")
+                if not text:
+                    continue
+                parts[choice.index].append(text)
+                if choice.index == 0 and on_chunk is not None:
+                    on_chunk(text)
+        outs = ["".join(p) for p in parts]
+    else:
+        outs = [c.message["content"] for c in resp.choices]  # type: ignore
+    out = outs if n > 1 else outs[0]
+    cache.put(prompt, out, MODEL, temperature, max_tokens, n)
+    return out
 
 
 def main():
@@ -31,6 +89,8 @@ def main():
         model_fn=call_model,
         enable_hitl=True,
         verbose=True,   # ✅ prints real-time progress + final story
+        stream=True,    # echo story drafts as they are generated
+        draft_candidates=2,  # two drafts in one request; the judge picks one
         debug=False,    # set True to see truncated spec/plan + top issues
     )
 
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from story_studio.observability import text_digest
+
+CacheKey = Tuple[str, float, int, int]  # (model, temperature, max_tokens, n)
+
+
+class PromptCache:
+    """Exact-match prompt → response cache for model calls (in memory + JSONL on disk).
+
+    Entries are keyed on the prompt hash and scoped by (model, temperature, max_tokens, n)
+    so different agent stages never answer for each other. The hash is
+    observability.text_digest, so it equals the prompt_hash logged on spans and the
+    span for a call reuses the memoized digest instead of hashing the prompt again.
+
+    There is deliberately no embedding-similarity tier: stage prompts are mostly fixed
+    template text, so whole-prompt embeddings of different requests (or of a draft and
+    its revision) score as near-duplicates and would return the wrong response.
+    """
+
+    def __init__(self, cache_dir: str = "story_studio/cache") -> None:
+        self.exact_path = Path(cache_dir) / "exact.jsonl"
+        self.exact_path.parent.mkdir(parents=True, exist_ok=True)
+        self._exact: Dict[Tuple[CacheKey, str], Any] = {}
+        self._lock = threading.Lock()  # model calls may run on worker threads
+        self._load()
+
+    def _load(self) -> None:
+        if not self.exact_path.exists():
+            return
+        with self.exact_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    key = (
+                        rec["model"],
+                        float(rec["temperature"]),
+                        int(rec["max_tokens"]),
+                        int(rec.get("n", 1)),
+                    )
+                    self._exact[(key, rec["prompt_hash"])] = rec["response"]
+                except Exception:
+                    continue  # tolerate a torn last line
+
+    def get(
+        self, prompt: str, model: str, temperature: float, max_tokens: int, n: int = 1
+    ) -> Optional[Any]:
+        key = (model, float(temperature), int(max_tokens), int(n))
+        return self._exact.get((key, text_digest(prompt)))
+
+    def put(
+        self, prompt: str, response: Any, model: str, temperature: float, max_tokens: int, n: int = 1
+    ) -> None:
+        key = (model, float(temperature), int(max_tokens), int(n))
+        h = text_digest(prompt)
+        rec = {
+            "model": model,
+            "temperature": float(temperature),
+            "max_tokens": int(max_tokens),
+            "n": int(n),
+            "prompt_hash": h,
+            "response": response,
+        }
+        with self._lock:
+            self._exact[(key, h)] = response
+            with self.exact_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
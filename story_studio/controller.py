@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-import json
+import math
 import re
 import time
 import uuid
-from typing import Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple, Union
 
+from story_studio import jsonio
 from story_studio.memory_store import MemoryStore, PreferenceMemory
 from story_studio.observability import Logger, Metrics, TraceContext, record_span
 from story_studio.prompts import (
@@ -13,29 +15,99 @@ from story_studio.prompts import (
     planner_prompt,
     storyteller_prompt,
     judge_prompt,
+    judge_candidates_prompt,
     reviser_prompt,
 )
 from story_studio.session import SessionState, JudgeReport
 
-ModelFn = Callable[[str, int, float], str]
+# model_fn(prompt, max_tokens, temperature[, n]) -> str, or list[str] when n > 1
+ModelFn = Callable[..., Union[str, List[str]]]
+
+
+_NAMED_RE = re.compile(r"named\s+([A-Za-z]{2,20})")
+
+
+def _balanced_object(text: str, start: int) -> str | None:
+    """Return the `{...}` starting at `start`, matched by brace depth in one linear pass.
+
+    Braces inside JSON strings (with backslash escapes) are ignored.
+    """
+    depth = 0
+    in_str = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return None
 
 
 def _extract_json(text: str) -> dict:
-    """Best-effort JSON extraction from model output."""
+    """Best-effort JSON extraction from model output.
+
+    Falls back to the first top-level balanced `{...}` that parses, so prose
+    around the object (or a stray `{...}` before it) is skipped in one linear scan.
+    """
     try:
-        return json.loads(text)
+        return jsonio.loads(text)
     except Exception:
         pass
 
-    m = re.search(r"\{[\s\S]*\}", text)
-    if m:
+    start = text.find("{")
+    while start >= 0:
+        obj = _balanced_object(text, start)
+        if obj is None:
+            return {}
         try:
-            return json.loads(m.group(0))
+            return jsonio.loads(obj)
         except Exception:
-            return {}
+            start = text.find("{", start + len(obj))
     return {}
 
 
+def _pick_candidate(obj: dict, n: int) -> int:
+    """0-based index of the judge's preferred candidate (falls back to the top score)."""
+    best = obj.get("best")
+    if _is_finite(best) and 1 <= int(float(best)) <= n:
+        return int(float(best)) - 1
+    scores = obj.get("candidate_scores") or []
+    if isinstance(scores, list) and len(scores) == n and all(_is_finite(x) for x in scores):
+        return max(range(n), key=lambda k: float(scores[k]))
+    return 0
+
+
+def _coalescing(model_fn: ModelFn, metrics: Metrics) -> ModelFn:
+    """Wrap `model_fn` so repeated identical requests within one session are sent once.
+
+    Keyed on (prompt, max_tokens, temperature, n); streaming kwargs only affect delivery.
+    """
+    memo: Dict[Tuple[Any, ...], Union[str, List[str]]] = {}
+
+    def call(prompt: str, max_tokens: int, temperature: float, *args, **kwargs):
+        key = (prompt, max_tokens, temperature, args)
+        if key in memo:
+            metrics.inc("model.coalesced", 1)
+            return memo[key]
+        out = model_fn(prompt, max_tokens, temperature, *args, **kwargs)
+        memo[key] = out
+        return out
+
+    return call
+
+
 def _is_number(x) -> bool:
     try:
         float(x)
@@ -44,6 +116,11 @@ def _is_number(x) -> bool:
         return False
 
 
+def _is_finite(x) -> bool:
+    # "NaN"/"Infinity" pass _is_number but break int() and comparisons
+    return _is_number(x) and math.isfinite(float(x))
+
+
 def _to_judge_report(obj: dict) -> JudgeReport:
     return JudgeReport(
         hard_flags=list(obj.get("hard_flags", []) or []),
@@ -79,7 +156,7 @@ def _hitl_update_memory(mem: PreferenceMemory, feedback: str) -> PreferenceMemor
     elif "funny" in fb or "humor" in fb:
         mem.preferred_tone = "funnier"
 
-    m = re.search(r"named\s+([A-Za-z]{2,20})", feedback)
+    m = _NAMED_RE.search(feedback)
     if m:
         mem.recurring_character = m.group(1)
 
@@ -95,209 +172,311 @@ def run_story_session(
     verbose: bool = True,
     debug: bool = False,
     printer=print,
+    speculative: bool = False,
+    draft_candidates: int = 1,
+    stream: bool = False,
 ) -> Tuple[str, str]:
     """End-to-end session controller.
 
+    With `draft_candidates > 1`, the draft step asks `model_fn` for that many
+    completions in one request (as a 4th positional arg, `n`, returning a list) and
+    a single judge call picks the best one. The default of 1 keeps the plain
+    `model_fn(prompt, max_tokens, temperature) -> str` contract.
+
+    With `stream=True` (and verbose), drafts are requested with
+    `model_fn(..., stream=True, on_chunk=...)` and echoed as they arrive.
+
+    With `speculative=True`, a revision of each draft is requested in parallel with
+    its judge call and used only if the judge asks for a plain revision without
+    specific instructions; otherwise it is discarded. Judges usually give
+    instructions, so this is opt-in: it trades an often-wasted extra completion
+    for one hidden round-trip when it does hit.
+
     Returns: (final_story, session_artifact_path)
     """
 
-    def _say(msg: str) -> None:
-        """Terminal progress output (kept short; avoids dumping full prompts)."""
+    def _say(fmt: str, *args) -> None:
+        """Terminal progress output (kept short; avoids dumping full prompts).
+
+        `%`-style args are only formatted when verbose, so quiet runs skip the work.
+        """
         if not verbose:
             return
+        msg = fmt % args if args else fmt
         try:
             printer(msg, flush=True)
         except TypeError:
             printer(msg)
 
+    def _echo(chunk: str) -> None:
+        """Streaming sink: print model text as it arrives, without line breaks."""
+        try:
+            printer(chunk, end="", flush=True)
+        except TypeError:
+            printer(chunk)
+
     session = SessionState.new(user_request)
     session.trace_id = str(uuid.uuid4())
 
-    _say(f"[Session] id={session.id} trace_id={session.trace_id}")
-    _say(f"[User] {user_request.strip()}")
+    _say("[Session] id=%s trace_id=%s", session.id, session.trace_id)
+    _say("[User] %s", user_request.strip())
 
     logger = Logger(logs_dir="story_studio/logs")
-    metrics = Metrics()
-    trace = TraceContext(trace_id=session.trace_id)
-
-    mem_store = MemoryStore("story_studio/memory/user_prefs.json")
-    memory = mem_store.load()
-
-    # 1) Interpreter
-    session.transition("INTERPRETING")
-    _say("[1/6] Interpreting request (intent + constraints)...")
-    prompt = interpreter_prompt(user_request=user_request, memory_pref=memory.to_text())
-    span = trace.child_span("interpreter")
-    t0 = time.time()
-    spec = model_fn(prompt, 800, 0.2)
-    _say(f"      ✓ done ({time.time()-t0:.1f}s)")
-    span.close(spec)
-    record_span(logger, metrics, span, prompt, spec)
-    session.request_spec = spec
-    session.transition("INTERPRETED")
-
-    if debug:
-        _say("      · request_spec (truncated):")
-        _say("      " + (spec.strip().replace("\n", " ")[:180] + ("..." if len(spec) > 180 else "")))
-
-    # 2) Planner
-    session.transition("PLANNING")
-    _say("[2/6] Planning story outline...")
-    prompt = planner_prompt(request_spec=spec)
-    span = trace.child_span("planner")
-    t0 = time.time()
-    plan = model_fn(prompt, 700, 0.2)
-    _say(f"      ✓ done ({time.time()-t0:.1f}s)")
-    span.close(plan)
-    record_span(logger, metrics, span, prompt, plan)
-    session.plan = plan
-    session.transition("PLANNED")
-
-    if debug:
-        _say("      · plan (truncated):")
-        _say("      " + (plan.strip().replace("\n", " ")[:180] + ("..." if len(plan) > 180 else "")))
-
-    # 3) Draft + judge + revise loop
-    story = ""
-    for i in range(max_iters + 1):
-        session.transition("DRAFTING")
-        _say(f"[3/6] Drafting story (v{i+1})...")
-        prompt = storyteller_prompt(request_spec=spec, plan=plan)
-        span = trace.child_span("storyteller")
+    try:
+        metrics = Metrics()
+        trace = TraceContext(trace_id=session.trace_id)
+        model_fn = _coalescing(model_fn, metrics)
+
+        mem_store = MemoryStore("story_studio/memory/user_prefs.json")
+        memory = mem_store.load()
+
+        # 1) Interpreter
+        session.transition("INTERPRETING")
+        _say("[1/6] Interpreting request (intent + constraints)...")
+        prompt = interpreter_prompt(user_request=user_request, memory_pref=memory.to_text())
+        span = trace.child_span("interpreter")
         t0 = time.time()
-        story = model_fn(prompt, 2200, base_temperature)
-        _say(f"      ✓ done ({time.time()-t0:.1f}s)")
-        span.close(story, meta={"iteration": i})
-        record_span(logger, metrics, span, prompt, story)
-        session.drafts.append(story)
-        session.transition("DRAFTED")
-
-        session.transition("JUDGING")
-        _say("[4/6] Judging quality & safety...")
-        prompt = judge_prompt(request_spec=spec, story=story)
-        span = trace.child_span("judge")
+        spec = model_fn(prompt, 800, 0.2)
+        _say("      ✓ done (%.1fs)", time.time() - t0)
+        span.close(spec)
+        record_span(logger, metrics, span, prompt, spec)
+        session.request_spec = spec
+        session.transition("INTERPRETED")
+
+        if debug:
+            _say("      · request_spec (truncated):")
+            _say("      %s%s", spec[:180].strip().replace("\n", " "), "..." if len(spec) > 180 else "")
+
+        # 2) Planner
+        session.transition("PLANNING")
+        _say("[2/6] Planning story outline...")
+        prompt = planner_prompt(request_spec=spec)
+        span = trace.child_span("planner")
         t0 = time.time()
-        j_raw = model_fn(prompt, 800, 0.0)
-        _say(f"      ✓ done ({time.time()-t0:.1f}s)")
-        span.close(j_raw, meta={"iteration": i})
-        record_span(logger, metrics, span, prompt, j_raw)
-
-        j_obj = _extract_json(j_raw)
-        j_report = _to_judge_report(j_obj)
-        session.judge_reports.append(j_report)
-
-        # user-facing judge summary
-        cozy = (j_report.scores or {}).get("coziness")
-        age_fit = (j_report.scores or {}).get("age_fit")
-        _say(
-            f"      · pass={j_report.pass_} rewrite_required={j_report.rewrite_required} "
-            f"hard_flags={len(j_report.hard_flags)} cozy={cozy} age_fit={age_fit}"
-        )
-        if debug and j_report.issues:
-            _say("      · top issues: " + "; ".join(j_report.issues[:3]))
-
-        # metrics
-        metrics.inc("judge.calls", 1)
-        if j_report.pass_:
-            metrics.inc("judge.pass", 1)
-        if j_report.rewrite_required:
-            metrics.inc("judge.rewrite_required", 1)
-        for k, v in (j_report.scores or {}).items():
-            metrics.set_gauge(f"score.{k}", v)
-
-        session.transition("JUDGED")
-
-        if j_report.pass_:
-            session.transition("FINALIZED")
-            session.final_story = story
-            break
-
-        if i == max_iters:
-            # best-effort stop
-            session.transition("FINALIZED")
-            session.final_story = story
-            break
-
-        session.transition("REVISING")
-        _say("[5/6] Revising story based on judge feedback...")
-        if j_report.rewrite_required:
-            prompt = storyteller_prompt(request_spec=spec, plan=plan)
-            span = trace.child_span("rewrite")
-            t0 = time.time()
-            story = model_fn(prompt, 2200, 0.2)
-            _say(f"      ✓ rewritten ({time.time()-t0:.1f}s)")
-            span.close(story, meta={"iteration": i, "mode": "rewrite"})
-            record_span(logger, metrics, span, prompt, story)
-        else:
-            prompt = reviser_prompt(
-                request_spec=spec,
-                story=story,
-                revision_instructions=j_report.revision_instructions,
-            )
-            span = trace.child_span("reviser")
-            t0 = time.time()
-            story = model_fn(prompt, 2200, 0.25)
-            _say(f"      ✓ revised ({time.time()-t0:.1f}s)")
-            span.close(story, meta={"iteration": i, "mode": "revise"})
-            record_span(logger, metrics, span, prompt, story)
-
-        session.drafts.append(story)
-        session.transition("REVISED")
-
-    # 4) Finalize + show result
-    _say("[6/6] Finalizing story...")
-    final_story = session.final_story or story
-    _say("      ✓ done")
-
-    if verbose:
-        _say("\n--- STORY ---")
-        printer(final_story)
-        _say("--- END STORY ---\n")
-
-    # HITL feedback (optional) — only after the user sees a complete story.
-    if enable_hitl:
-        fb = _hitl_collect_feedback()
-        if fb:
-            session.user_feedback = fb
-
-            # 1) update preference memory (opt-in)
-            memory = _hitl_update_memory(memory, fb)
-            mem_store.save(memory)
-            metrics.inc("hitl.feedback", 1)
-
-            # 2) immediately apply feedback to rewrite/revise the story (post-output pass)
-            _say("[HITL] Applying your feedback to produce an updated story...")
-
-            hitl_instructions = [
-                f"User feedback: {fb}",
-                "Apply the feedback while keeping the story safe and age-appropriate (5–10).",
-                "Do not add scary elements. Keep a cozy bedtime ending.",
-            ]
-
-            prompt = reviser_prompt(
-                request_spec=spec,
-                story=final_story,
-                revision_instructions=hitl_instructions,
-            )
-
-            span = trace.child_span("hitl_reviser")
-            t0 = time.time()
-            updated_story = model_fn(prompt, 2200, 0.35)
-            _say(f"      ✓ updated ({time.time()-t0:.1f}s)")
-            span.close(updated_story, meta={"mode": "hitl_revise"})
-            record_span(logger, metrics, span, prompt, updated_story)
-
-            session.drafts.append(updated_story)
-            session.final_story = updated_story
-            final_story = updated_story
-
-            _say("\n--- UPDATED STORY (after your feedback) ---")
+        plan = model_fn(prompt, 700, 0.2)
+        _say("      ✓ done (%.1fs)", time.time() - t0)
+        span.close(plan)
+        record_span(logger, metrics, span, prompt, plan)
+        session.plan = plan
+        session.transition("PLANNED")
+
+        if debug:
+            _say("      · plan (truncated):")
+            _say("      %s%s", plan[:180].strip().replace("\n", " "), "..." if len(plan) > 180 else "")
+
+        # 3) Draft once, then judge + revise until pass or max_iters
+        # (later iterations judge the revision; redrafting would resend the identical prompt)
+        story = ""
+        # model_fn is network-bound, so a worker thread overlaps the speculative revise with the judge
+        # one worker per possible speculative call, so a discarded one still running
+        # (cancel() can't stop it) never queues ahead of the next iteration's
+        executor = ThreadPoolExecutor(max_workers=max(1, max_iters)) if speculative else None
+        try:
+            for i in range(max_iters + 1):
+                if i == 0:
+                    session.transition("DRAFTING")
+                    _say("[3/6] Drafting story...")
+                    prompt = storyteller_prompt(request_spec=spec, plan=plan)
+                    span = trace.child_span("storyteller")
+                    t0 = time.time()
+                    stream_kw = {"stream": True, "on_chunk": _echo} if stream and verbose else {}
+                    if stream_kw and draft_candidates > 1:
+                        # only the first candidate streams; the judge may pick another
+                        _say("      · preview of candidate 1/%d:", draft_candidates)
+                    if draft_candidates > 1:
+                        out = model_fn(prompt, 2200, base_temperature, draft_candidates, **stream_kw)
+                    else:
+                        out = model_fn(prompt, 2200, base_temperature, **stream_kw)
+                    if stream_kw:
+                        _say("")  # end the streamed line
+                    candidates = out if isinstance(out, list) else [out]
+                    story = candidates[0]
+                    _say("      ✓ done (%.1fs, %d candidate(s))", time.time() - t0, len(candidates))
+                    joined = "\n\n".join(candidates)
+                    span.close(joined, meta={"iteration": i, "candidates": len(candidates)})
+                    record_span(logger, metrics, span, prompt, joined)
+                    session.drafts.extend(candidates)
+                    session.transition("DRAFTED")
+                else:
+                    candidates = [story]
+
+                spec_future = None
+                if executor is not None and i < max_iters:
+                    # speculate on the first candidate; only useful if the judge picks it
+                    spec_prompt = reviser_prompt(request_spec=spec, story=story, revision_instructions=[])
+                    spec_span = trace.child_span("reviser")
+                    spec_future = executor.submit(model_fn, spec_prompt, 2200, 0.25)
+
+                session.transition("JUDGING")
+                _say("[4/6] Judging quality & safety...")
+                if len(candidates) > 1:
+                    prompt = judge_candidates_prompt(request_spec=spec, stories=candidates)
+                else:
+                    prompt = judge_prompt(request_spec=spec, story=story)
+                span = trace.child_span("judge")
+                t0 = time.time()
+                j_raw = model_fn(prompt, 800, 0.0)
+                _say("      ✓ done (%.1fs)", time.time() - t0)
+                span.close(j_raw, meta={"iteration": i})
+                record_span(logger, metrics, span, prompt, j_raw)
+
+                j_obj = _extract_json(j_raw)
+                j_report = _to_judge_report(j_obj)
+                if len(candidates) > 1:
+                    best = _pick_candidate(j_obj, len(candidates))
+                    if best != 0 and spec_future is not None:
+                        spec_future.cancel()
+                        metrics.inc("speculative.discarded", 1)
+                        spec_future = None
+                    story = candidates[best]
+                    _say("      · picked candidate %d/%d", best + 1, len(candidates))
+                session.judge_reports.append(j_report)
+
+                # user-facing judge summary
+                cozy = (j_report.scores or {}).get("coziness")
+                age_fit = (j_report.scores or {}).get("age_fit")
+                _say(
+                    "      · pass=%s rewrite_required=%s hard_flags=%d cozy=%s age_fit=%s",
+                    j_report.pass_, j_report.rewrite_required, len(j_report.hard_flags), cozy, age_fit,
+                )
+                if debug and j_report.issues:
+                    _say("      · top issues: %s", "; ".join(j_report.issues[:3]))
+
+                # metrics
+                metrics.inc("judge.calls", 1)
+                if j_report.pass_:
+                    metrics.inc("judge.pass", 1)
+                if j_report.rewrite_required:
+                    metrics.inc("judge.rewrite_required", 1)
+                for k, v in (j_report.scores or {}).items():
+                    metrics.set_gauge(f"score.{k}", v)
+
+                session.transition("JUDGED")
+
+                if j_report.pass_:
+                    if spec_future is not None:
+                        spec_future.cancel()  # no-op if already running; its result is ignored
+                        metrics.inc("speculative.discarded", 1)
+                    session.transition("FINALIZED")
+                    session.final_story = story
+                    break
+
+                if i == max_iters:
+                    # best-effort stop
+                    session.transition("FINALIZED")
+                    session.final_story = story
+                    break
+
+                session.transition("REVISING")
+                _say("[5/6] Revising story based on judge feedback...")
+                if j_report.rewrite_required:
+                    # a reviser pass driven by the judge's findings, rather than re-sending the
+                    # storyteller prompt that produced the flagged draft
+                    prompt = reviser_prompt(
+                        request_spec=spec,
+                        story=story,
+                        revision_instructions=[f"Remove entirely: {f}" for f in j_report.hard_flags]
+                        + j_report.revision_instructions
+                        + ["Rewrite any scene as needed so the whole story is calm and safe for bedtime."],
+                    )
+                    span = trace.child_span("rewrite")
+                    t0 = time.time()
+                    story = model_fn(prompt, 2200, 0.2)
+                    _say("      ✓ rewritten (%.1fs)", time.time() - t0)
+                    span.close(story, meta={"iteration": i, "mode": "rewrite"})
+                    record_span(logger, metrics, span, prompt, story)
+                    if spec_future is not None:
+                        spec_future.cancel()
+                        metrics.inc("speculative.discarded", 1)
+                elif spec_future is not None and not j_report.revision_instructions:
+                    # speculative prompt is exactly what the reviser would send now
+                    t0 = time.time()
+                    story = spec_future.result()
+                    _say("      ✓ revised (speculative, waited %.1fs)", time.time() - t0)
+                    spec_span.close(story, meta={"iteration": i, "mode": "revise", "speculative": True})
+                    record_span(logger, metrics, spec_span, spec_prompt, story)
+                    metrics.inc("speculative.used", 1)
+                else:
+                    if spec_future is not None:
+                        spec_future.cancel()
+                        metrics.inc("speculative.discarded", 1)
+                    prompt = reviser_prompt(
+                        request_spec=spec,
+                        story=story,
+                        revision_instructions=j_report.revision_instructions,
+                    )
+                    span = trace.child_span("reviser")
+                    t0 = time.time()
+                    story = model_fn(prompt, 2200, 0.25)
+                    _say("      ✓ revised (%.1fs)", time.time() - t0)
+                    span.close(story, meta={"iteration": i, "mode": "revise"})
+                    record_span(logger, metrics, span, prompt, story)
+
+                session.drafts.append(story)
+                session.transition("REVISED")
+        finally:
+            if executor is not None:
+                # don't wait on discarded speculative calls; drop any still queued
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        # 4) Finalize + show result
+        _say("[6/6] Finalizing story...")
+        final_story = session.final_story or story
+        _say("      ✓ done")
+
+        if verbose:
+            _say("\n--- STORY ---")
             printer(final_story)
-            _say("--- END UPDATED STORY ---\n")
-
-    # Always persist and return a tuple
-    session.metrics = metrics.snapshot()
-    session_path = session.save(sessions_dir="story_studio/sessions")
-    _say(f"[Saved] {session_path}")
-
-    return final_story, session_path
+            _say("--- END STORY ---\n")
+
+        # HITL feedback (optional) — only after the user sees a complete story.
+        if enable_hitl:
+            fb = _hitl_collect_feedback()
+            if fb:
+                session.user_feedback = fb
+
+                # 1) update preference memory (opt-in)
+                memory = _hitl_update_memory(memory, fb)
+                mem_store.save(memory)
+                metrics.inc("hitl.feedback", 1)
+
+                # 2) immediately apply feedback to rewrite/revise the story (post-output pass)
+                _say("[HITL] Applying your feedback to produce an updated story...")
+
+                hitl_instructions = [
+                    f"User feedback: {fb}",
+                    "Apply the feedback while keeping the story safe and age-appropriate (5–10).",
+                    "Do not add scary elements. Keep a cozy bedtime ending.",
+                ]
+
+                prompt = reviser_prompt(
+                    request_spec=spec,
+                    story=final_story,
+                    revision_instructions=hitl_instructions,
+                )
+
+                span = trace.child_span("hitl_reviser")
+                t0 = time.time()
+                updated_story = model_fn(prompt, 2200, 0.35)
+                _say("      ✓ updated (%.1fs)", time.time() - t0)
+                span.close(updated_story, meta={"mode": "hitl_revise"})
+                record_span(logger, metrics, span, prompt, updated_story)
+
+                session.drafts.append(updated_story)
+                session.final_story = updated_story
+                final_story = updated_story
+
+                _say("\n--- UPDATED STORY (after your feedback) ---")
+                printer(final_story)
+                _say("--- END UPDATED STORY ---\n")
+
+        # Always persist and return a tuple
+        logger.close()  # drains the background writer before the session artifact is saved
+        session.metrics = metrics.snapshot()
+        session_path = session.save(sessions_dir="story_studio/sessions")
+        _say("[Saved] %s", session_path)
+
+        return final_story, session_path
+    finally:
+        # drain queued events even when a stage raises (no-op after the normal close)
+        logger.close()
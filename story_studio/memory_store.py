@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import json
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
+from story_studio import jsonio
+
 
 @dataclass
 class PreferenceMemory:
@@ -37,8 +38,8 @@ class MemoryStore:
     def load(self) -> PreferenceMemory:
         if not self.path.exists():
             return PreferenceMemory()
-        data = json.loads(self.path.read_text(encoding="utf-8"))
+        data = jsonio.loads(self.path.read_bytes())
         return PreferenceMemory(**data)
 
     def save(self, mem: PreferenceMemory) -> None:
-        self.path.write_text(json.dumps(mem.__dict__, ensure_ascii=False, indent=2), encoding="utf-8")
+        self.path.write_bytes(jsonio.dumps(mem.__dict__, indent=True))
@@ -1,15 +1,33 @@
 from __future__ import annotations
 
+import array
+import atexit
+import functools
 import hashlib
-import json
+import math
+import os
+import queue
+import secrets
+import threading
 import time
+import weakref
 from dataclasses import dataclass, asdict
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+from story_studio import jsonio
 
-def _sha256(text: str) -> str:
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+@functools.lru_cache(maxsize=64)
+def text_digest(text: str) -> str:
+    """Content fingerprint for prompts/outputs (not a security boundary).
+
+    Memoized on the string itself: loop iterations rebuild identical prompts, and
+    an output is often fingerprinted again when it is fed to the next stage.
+    """
+    # one fixed algorithm/width: these digests are persisted (cache keys, span logs),
+    # so they must not change with the installed packages
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
 
 
 @dataclass
@@ -24,23 +42,133 @@ class Span:
     output_hash: Optional[str] = None
     meta: Optional[Dict[str, Any]] = None
 
+    def __post_init__(self) -> None:
+        # plain attribute (not a field), so it stays out of asdict() and the logs
+        self._t0_ns = time.monotonic_ns()
+
     def close(self, output: str, meta: Optional[Dict[str, Any]] = None) -> None:
-        self.end_ms = int(time.time() * 1000)
-        self.output_hash = _sha256(output)
+        # wall-clock start + monotonic elapsed: durations survive clock adjustments
+        self.end_ms = self.start_ms + (time.monotonic_ns() - self._t0_ns) // 1_000_000
+        self.output_hash = text_digest(output)
         if meta:
             self.meta = {**(self.meta or {}), **meta}
 
 
+_BATCH_MAX = 64
+
+
+def _drain(q: queue.SimpleQueue, fd: int, errors: list) -> None:
+    """Writer thread: append queued lines in batches; `Event` items mark flush points."""
+    while True:
+        item = q.get()
+        lines: list[bytes] = []
+        markers: list[threading.Event] = []
+        stop = False
+        while True:
+            if item is None:
+                stop = True
+                break
+            if isinstance(item, threading.Event):
+                markers.append(item)
+            else:
+                lines.append(item)
+                if len(lines) >= _BATCH_MAX:
+                    break
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+        if lines:
+            try:
+                os.write(fd, b"".join(lines))
+            except OSError as e:
+                errors.append(e)
+        for m in markers:
+            m.set()
+        if stop:
+            return
+
+
+# Loggers not yet closed; drained at interpreter exit, while the daemon writer threads
+# are still running (__del__ runs too late for that).
+_OPEN_LOGGERS: "weakref.WeakSet[Logger]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_loggers() -> None:
+    for lg in list(_OPEN_LOGGERS):
+        try:
+            lg.close()
+        except OSError:
+            pass
+
+
 class Logger:
-    """Simple JSONL logger: Logs (diary) + Traces (narrative)."""
+    """Simple JSONL logger: Logs (diary) + Traces (narrative).
+
+    `event()` only serializes and enqueues; a daemon thread does the disk writes,
+    so a slow filesystem never stalls the next model call. `flush()` waits for
+    everything queued so far to be written.
+    """
 
     def __init__(self, logs_dir: str) -> None:
         self.logs_path = Path(logs_dir) / "events.jsonl"
         self.logs_path.parent.mkdir(parents=True, exist_ok=True)
+        # One O_APPEND fd for the logger's lifetime; each batch is a single os.write,
+        # which keeps lines whole even with several processes appending.
+        self._fd: Optional[int] = os.open(self.logs_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._errors: list[OSError] = []
+        # the thread gets no reference to self, so __del__ can still run
+        self._writer = threading.Thread(
+            target=_drain,
+            args=(self._queue, self._fd, self._errors),
+            name="story-studio-logger",
+            daemon=True,
+        )
+        self._writer.start()
+        _OPEN_LOGGERS.add(self)
 
     def event(self, event: Dict[str, Any]) -> None:
-        with self.logs_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        if self._fd is None:
+            raise ValueError("Logger is closed")
+        # serialize here so errors surface to the caller and later mutation of `event` can't leak in
+        self._queue.put(jsonio.dumps(event) + b"\n")
+
+    def flush(self) -> None:
+        if self._fd is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        if self._errors:
+            raise self._errors.pop(0)
+
+    def close(self) -> None:
+        fd, self._fd = getattr(self, "_fd", None), None
+        if fd is None:
+            return
+        _OPEN_LOGGERS.discard(self)
+        self._queue.put(None)
+        self._writer.join()
+        os.close(fd)
+        if self._errors:
+            raise self._errors.pop(0)
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except OSError:
+            pass
+
+
+def _select(vals: array.array, k: int) -> int:
+    """k-th smallest sample; O(n) via numpy when installed (imported only when needed)."""
+    try:
+        import numpy as np
+    except ImportError:  # pragma: no cover
+        return sorted(vals)[k]
+    return int(np.partition(np.frombuffer(vals, dtype=np.intc), k)[k])
 
 
 class Metrics:
@@ -48,24 +176,25 @@ class Metrics:
 
     def __init__(self) -> None:
         self.counters: Dict[str, int] = {}
-        self.timers_ms: Dict[str, list[int]] = {}
+        self.timers_ms: Dict[str, array.array] = {}  # compact C-int samples
         self.gauges: Dict[str, float] = {}
 
     def inc(self, name: str, n: int = 1) -> None:
         self.counters[name] = self.counters.get(name, 0) + n
 
     def observe_ms(self, name: str, ms: int) -> None:
-        self.timers_ms.setdefault(name, []).append(ms)
+        self.timers_ms.setdefault(name, array.array("i")).append(int(ms))
 
     def set_gauge(self, name: str, value: float) -> None:
         self.gauges[name] = float(value)
 
     def snapshot(self) -> Dict[str, Any]:
-        def summary(vals: list[int]) -> Dict[str, float]:
+        def summary(vals: array.array) -> Dict[str, float]:
             if not vals:
                 return {"count": 0, "mean_ms": 0.0, "p95_ms": 0.0}
-            s = sorted(vals)
-            p95 = s[int(0.95 * (len(s) - 1))]
+            # nearest-rank p95; sorting is cheaper than numpy setup for short series
+            k = max(0, math.ceil(0.95 * len(vals)) - 1)
+            p95 = sorted(vals)[k] if len(vals) < 32 else _select(vals, k)
             return {
                 "count": len(vals),
                 "mean_ms": sum(vals) / len(vals),
@@ -84,18 +213,19 @@ class TraceContext:
     trace_id: str
 
     def child_span(self, name: str, parent_span_id: Optional[str] = None) -> Span:
-        span_id = _sha256(f"{self.trace_id}:{name}:{time.time()}")[:16]
         return Span(
             trace_id=self.trace_id,
-            span_id=span_id,
+            span_id=secrets.token_hex(8),
             parent_span_id=parent_span_id,
             name=name,
-            start_ms=int(time.time() * 1000),
+            start_ms=time.time_ns() // 1_000_000,
         )
 
 
 def record_span(logger: Logger, metrics: Metrics, span: Span, prompt: str, output: str) -> None:
-    span.prompt_hash = _sha256(prompt)
+    # text_digest is memoized and shared with the prompt cache, so a prompt the cache
+    # already hashed is a lookup here rather than a second pass over its bytes
+    span.prompt_hash = text_digest(prompt)
     if span.end_ms is None:
         span.close(output)
     duration = int(span.end_ms - span.start_ms) if span.end_ms else 0
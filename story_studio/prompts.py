@@ -32,6 +32,52 @@ class ResearchBackedRubric:
 
 RUBRIC = ResearchBackedRubric()
 
+# RUBRIC is frozen, so its bullet blocks (and prompt text built only from them) are constants.
+_HARD_BULLETS = "\n".join(f"- {x}" for x in RUBRIC.hard_safety)
+_SOFT_BULLETS = "\n".join(f"- {x}" for x in RUBRIC.quality_dims)
+
+# Shared by judge_prompt and judge_candidates_prompt so the two judges can't drift apart;
+# the report schema must stay in sync with controller._to_judge_report.
+_JUDGE_INTRO = (
+    "You are a conservative evaluator (LLM Judge) for AI-generated bedtime stories for children ages 5–10."
+)
+
+_JUDGE_RUBRIC = f"""Hard safety constraints (gating):
+{_HARD_BULLETS}
+
+Soft quality dimensions (graded):
+{_SOFT_BULLETS}"""
+
+_JUDGE_DECISION_RULES = """   - pass: true only if no hard violations AND overall quality is suitable for bedtime.
+   - rewrite_required: true if there is any hard violation OR the story is too scary/stimulating for bedtime."""
+
+# body of the report object (without the outer braces)
+_JUDGE_REPORT_SCHEMA = '''  "hard_flags": ["..."],
+  "pass": true/false,
+  "rewrite_required": true/false,
+  "scores": {
+    "age_fit": 0-10,
+    "coziness": 0-10,
+    "low_arousal": 0-10,
+    "structure": 0-10,
+    "cultural_ethics": 0-10,
+    "intent_alignment": 0-10
+  },
+  "issues": ["..."],
+  "revision_instructions": ["..."],
+  "one_sentence_verdict": "..."'''
+
+_STORYTELLER_HEAD = f"""You are a bedtime storyteller for children ages 5–10.
+
+Hard safety constraints (must obey):
+{_HARD_BULLETS}
+
+Style constraints:
+- Calm, warm, reassuring.
+- Simple language; short paragraphs.
+- Gentle humor is OK, but keep arousal low.
+- Clear beginning-middle-end; end with closure and sleepiness."""
+
 
 def interpreter_prompt(user_request: str, memory_pref: str | None) -> str:
     pref = memory_pref or "(none)"
@@ -83,17 +129,7 @@ Output as 6–8 bullet points:
 
 
 def storyteller_prompt(request_spec: str, plan: str) -> str:
-    hard = "\n".join(f"- {x}" for x in RUBRIC.hard_safety)
-    return f"""You are a bedtime storyteller for children ages 5–10.
-
-Hard safety constraints (must obey):
-{hard}
-
-Style constraints:
-- Calm, warm, reassuring.
-- Simple language; short paragraphs.
-- Gentle humor is OK, but keep arousal low.
-- Clear beginning-middle-end; end with closure and sleepiness.
+    return f"""{_STORYTELLER_HEAD}
 
 Request Spec:
 {request_spec}
@@ -105,42 +141,22 @@ Write the full story (about 600–900 words).""".strip()
 
 
 def judge_prompt(request_spec: str, story: str) -> str:
-    hard = "\n".join(f"- {x}" for x in RUBRIC.hard_safety)
-    soft = "\n".join(f"- {x}" for x in RUBRIC.quality_dims)
-    return f"""You are a conservative evaluator (LLM Judge) for AI-generated bedtime stories for children ages 5–10.
+    return f"""{_JUDGE_INTRO}
 
 You MUST output a single JSON object. No extra text.
 
-Hard safety constraints (gating):
-{hard}
-
-Soft quality dimensions (graded):
-{soft}
+{_JUDGE_RUBRIC}
 
 Task:
 1) Identify any hard safety violations.
 2) Evaluate the story along the soft dimensions.
 3) Decide:
-   - pass: true only if no hard violations AND overall quality is suitable for bedtime.
-   - rewrite_required: true if there is any hard violation OR the story is too scary/stimulating for bedtime.
+{_JUDGE_DECISION_RULES}
 4) Provide actionable revision instructions.
 
 Return JSON with this schema:
 {{
-  "hard_flags": ["..."],
-  "pass": true/false,
-  "rewrite_required": true/false,
-  "scores": {{
-    "age_fit": 0-10,
-    "coziness": 0-10,
-    "low_arousal": 0-10,
-    "structure": 0-10,
-    "cultural_ethics": 0-10,
-    "intent_alignment": 0-10
-  }},
-  "issues": ["..."],
-  "revision_instructions": ["..."],
-  "one_sentence_verdict": "..."
+{_JUDGE_REPORT_SCHEMA}
 }}
 
 Request Spec:
@@ -151,6 +167,38 @@ Story:
 """.strip()
 
 
+def judge_candidates_prompt(request_spec: str, stories: list[str]) -> str:
+    numbered = "\n\n".join(f"Story {i}:\n{s}" for i, s in enumerate(stories, 1))
+    return f"""{_JUDGE_INTRO}
+
+You are given {len(stories)} candidate stories for the same request.
+You MUST output a single JSON object. No extra text.
+
+{_JUDGE_RUBRIC}
+
+Task:
+1) Score every candidate overall (0-10), treating any hard safety violation as 0.
+2) Pick the best candidate.
+3) For the best candidate only:
+   - Identify any hard safety violations.
+   - Evaluate it along the soft dimensions.
+{_JUDGE_DECISION_RULES}
+   - Provide actionable revision instructions.
+
+Return JSON with this schema:
+{{
+  "candidate_scores": [0-10, ...],
+  "best": 1-{len(stories)},
+{_JUDGE_REPORT_SCHEMA}
+}}
+
+Request Spec:
+{request_spec}
+
+{numbered}
+""".strip()
+
+
 def reviser_prompt(request_spec: str, story: str, revision_instructions: list[str]) -> str:
     instr = "\n".join(f"- {x}" for x in revision_instructions)
     return f"""You are a reviser for a bedtime story for children ages 5–10.
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-import json
 import os
 import time
 import uuid
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, fields
 from typing import Any, Dict, List, Optional
 
+from story_studio import jsonio
+
 
 @dataclass
 class JudgeReport:
@@ -68,13 +69,15 @@ class SessionState:
         self.state = to_state
 
     def to_dict(self) -> Dict[str, Any]:
-        d = asdict(self)
-        # dataclass JudgeReport → dict already handled by asdict
+        # Not asdict(): that deep-copies every draft and report, while serialization
+        # only needs a view that aliases them. Driven by fields() so new fields are kept.
+        d = {f.name: getattr(self, f.name) for f in fields(self)}
+        d["judge_reports"] = [jr.__dict__ for jr in self.judge_reports]
         return d
 
     def save(self, sessions_dir: str = "story_studio/sessions") -> str:
         os.makedirs(sessions_dir, exist_ok=True)
         path = os.path.join(sessions_dir, f"{self.id}.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        with open(path, "wb") as f:
+            f.write(jsonio.dumps(self.to_dict(), indent=True))
         return path